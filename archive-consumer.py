@@ -0,0 +1,194 @@
+"""
+    This program listens for price and alert messages continuously and writes them
+    to the local price archive (see price_archive.py).
+
+    Messages are collected into batches. A batch is committed to the archive when it
+    reaches BATCH_SIZE messages or every FLUSH_SECONDS, whichever comes first, and the
+    messages are only acknowledged after the commit succeeds. If a commit fails, the
+    batch is sent to the dead-letter queue instead.
+
+    Author: Beth Harvey
+    Date: October 5, 2023
+
+"""
+
+import pika
+import sys
+import json
+
+# Import dead-letter topology and failed-message handling
+from dead_letter import declare_work_queue, handle_failed_message, POISON_ERRORS
+
+# Import the price archive
+from price_archive import PriceArchive, ARCHIVE_ALERT_QUEUE, to_iso_date
+
+# Configure logging
+from util_logger import setup_logger
+
+logger, logname = setup_logger(__file__)
+
+# number of messages to collect before committing to the archive
+BATCH_SIZE = 50
+
+# commit whatever has been collected at least this often
+FLUSH_SECONDS = 60
+
+# rows waiting to be committed and the delivery tag of the newest message in the batch
+BATCH = {"prices": [], "alerts": [], "last_tag": None}
+
+ARCHIVE = None
+
+
+def flush_batch(ch):
+    """
+    Commit the collected rows to the archive in one transaction,
+    then acknowledge every message in the batch at once.
+    If the commit fails, the whole batch is sent to the dead-letter queue
+    (it can be replayed with dead-letter-tool.py), so the consumer keeps running
+    and does not try to commit the same batch forever.
+    """
+    if BATCH["last_tag"] is None:
+        return
+
+    try:
+        ARCHIVE.add_batch(BATCH["prices"], BATCH["alerts"])
+    except Exception as e:
+        logger.error("The batch could not be archived. Sending it to the dead-letter queue.")
+        logger.error(f"The error says: {e}.")
+        # the transaction was rolled back, so none of the batch was saved
+        ch.basic_nack(delivery_tag=BATCH["last_tag"], multiple=True, requeue=False)
+    else:
+        # multiple=True acknowledges every message up to and including last_tag
+        ch.basic_ack(delivery_tag=BATCH["last_tag"], multiple=True)
+        logger.info(
+            f" [x] Archived {len(BATCH['prices'])} price(s) and {len(BATCH['alerts'])} alert(s)."
+        )
+
+    BATCH["prices"] = []
+    BATCH["alerts"] = []
+    BATCH["last_tag"] = None
+
+
+def add_to_batch(ch, method, properties, body, table: str, parse):
+    """Parse a message, add it to the batch, and commit the batch once it is full."""
+    try:
+        BATCH[table].append(parse(body.decode()))
+        BATCH["last_tag"] = method.delivery_tag
+
+    except POISON_ERRORS as e:
+        logger.error(f"The {table} message could not be parsed.")
+        logger.error(f"The error says: {e}.")
+        # reject the poison message so it goes to the dead-letter queue
+        handle_failed_message(ch, method, properties, body, e, logger)
+        return
+
+    if len(BATCH["prices"]) + len(BATCH["alerts"]) >= BATCH_SIZE:
+        flush_batch(ch)
+
+
+def parse_price(message: str):
+    """Split a price message into (metal, date, open, high, low, close, volume)."""
+    date, metal, open_price, high, low, close, volume = message.split(",")
+    # some days in the data file have no volume (N/A), so archive those as NULL
+    volume = None if volume == "N/A" else float(volume)
+    # check the date now, so a bad date is dead-lettered instead of failing the batch
+    return metal, to_iso_date(date), float(open_price), float(high), float(low), float(close), volume
+
+
+def parse_alert(message: str):
+    """Read an alert message into (metal, date, alert_type, value, message)."""
+    alert = json.loads(message)
+    try:
+        return alert["metal"], to_iso_date(alert["date"]), alert["alert_type"], float(alert["value"]), alert["message"]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"alert is missing or has a bad value: {e}")
+
+
+# define callback functions to be called when a message is received
+def price_callback(ch, method, properties, body):
+    """Define behavior on getting a price message."""
+    add_to_batch(ch, method, properties, body, "prices", parse_price)
+
+
+def alert_callback(ch, method, properties, body):
+    """Define behavior on getting an alert message."""
+    add_to_batch(ch, method, properties, body, "alerts", parse_alert)
+
+
+# define a main function to run the program
+def main(hn: str = "localhost", price_qn: str = "05-archive-prices", alert_qn: str = ARCHIVE_ALERT_QUEUE):
+    """Continuously listen for price and alert messages and archive them."""
+    global ARCHIVE
+
+    # when a statement can go wrong, use a try-except block
+    try:
+        # try this code, if it works, keep going
+        # create a blocking connection to the RabbitMQ server
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=hn))
+
+    # except, if there's an error, do this
+    except Exception as e:
+        logger.error("ERROR: connection to RabbitMQ server failed.")
+        logger.error(f"Verify the server is running on host={hn}.")
+        logger.error(f"The error says: {e}")
+        sys.exit(1)
+
+    ARCHIVE = PriceArchive()
+
+    try:
+        # use the connection to create a communication channel
+        channel = connection.channel()
+
+        # use the channel to declare both durable queues
+        # rejected messages are routed to the dead-letter queue
+        declare_work_queue(channel, price_qn)
+        declare_work_queue(channel, alert_qn)
+
+        # allow a full batch of messages in flight,
+        # since they are not acknowledged until the batch is committed
+        channel.basic_qos(prefetch_count=BATCH_SIZE)
+
+        channel.basic_consume(
+            queue=price_qn, on_message_callback=price_callback, auto_ack=False
+        )
+        channel.basic_consume(
+            queue=alert_qn, on_message_callback=alert_callback, auto_ack=False
+        )
+
+        # commit partial batches on a timer so slow streams are still archived
+        def flush_timer():
+            flush_batch(channel)
+            connection.call_later(FLUSH_SECONDS, flush_timer)
+
+        connection.call_later(FLUSH_SECONDS, flush_timer)
+
+        # print a message to the console for the user
+        logger.info(" [*] Ready for work. To exit press CTRL+C")
+
+        # start consuming messages via the communication channel
+        channel.start_consuming()
+
+    # except, in the event of an error OR user stops the process, do this
+    # uncommitted messages are not acknowledged, so RabbitMQ redelivers them next time
+    except Exception as e:
+        logger.error("ERROR: something went wrong.")
+        logger.error(f"The error says: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        # archive whatever has been collected before stopping
+        flush_batch(channel)
+        logger.warning(" User interrupted continuous listening process.")
+        sys.exit(0)
+    finally:
+        print("\nClosing connection. Goodbye.\n")
+        ARCHIVE.close()
+        connection.close()
+
+
+# Standard Python idiom to indicate main program entry point
+# This allows us to import this module and use its functions
+# without executing the code below.
+# If this is the program being run, then execute the code below
+if __name__ == "__main__":
+    # call the main function with the information needed
+    main("localhost", "05-archive-prices", ARCHIVE_ALERT_QUEUE)
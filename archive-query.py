@@ -0,0 +1,100 @@
+"""
+    This program answers questions about archived prices and alerts
+    using the indexes in the price archive (see price_archive.py).
+
+    Usage:
+        python3 archive-query.py alerts START END [--metal METAL]
+        python3 archive-query.py prices METAL START END
+        python3 archive-query.py ohlc METAL START END
+
+    Dates can be entered as YYYY-MM-DD or in the CSV format (such as 8/19/13).
+    METAL is gold, silver, or ratio (ratio is only used for alerts).
+
+    Examples:
+        All silver alerts in 2020:
+            python3 archive-query.py alerts 2020-01-01 2020-12-31 --metal silver
+        Gold open, high, low, and close for the first half of 2021:
+            python3 archive-query.py ohlc gold 2021-01-01 2021-06-30
+
+    Author: Beth Harvey
+    Date: October 5, 2023
+
+"""
+
+import sys
+import argparse
+
+# Import the price archive
+from price_archive import PriceArchive, ARCHIVE_PATH, to_iso_date
+
+
+def query_date(value: str) -> str:
+    """Check a date from the command line and convert it to YYYY-MM-DD."""
+    try:
+        return to_iso_date(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid date {value!r} (use YYYY-MM-DD or M/D/YY)"
+        )
+
+
+def main(command: str, start: str, end: str, metal: str = None):
+    """Run a query against the archive and print the results."""
+    if not ARCHIVE_PATH.exists():
+        print(f"No archive found at {ARCHIVE_PATH}. Run archive-consumer.py first.")
+        sys.exit(1)
+
+    # open read-only, so a query never writes to the archive consumer's database
+    archive = PriceArchive(read_only=True)
+    try:
+        if command == "alerts":
+            rows = archive.get_alerts(start, end, metal)
+            for row in rows:
+                print(f"{row['date']} {row['metal']} {row['alert_type']} ({row['value']}): {row['message']}")
+            print(f"{len(rows)} alert(s) found.")
+
+        elif command == "prices":
+            rows = archive.get_prices(metal, start, end)
+            print("date,open,high,low,close,volume")
+            for row in rows:
+                volume = "n/a" if row["volume"] is None else row["volume"]
+                print(f"{row['date']},{row['open']},{row['high']},{row['low']},{row['close']},{volume}")
+            print(f"{len(rows)} day(s) found.")
+
+        else:
+            row = archive.get_ohlc(metal, start, end)
+            if row is None:
+                print(f"No {metal} prices found between {start} and {end}.")
+            else:
+                print(f"{metal} from {row['start_date']} to {row['end_date']} ({row['days']} days):")
+                # volume is missing (NULL) when no day in the range has a volume
+                volume = "n/a" if row["volume"] is None else f"{row['volume']:.0f}"
+                print(f"Open ${row['open']}, High ${row['high']}, Low ${row['low']}, Close ${row['close']}, Volume {volume}")
+    finally:
+        archive.close()
+
+
+# Standard Python idiom to indicate main program entry point
+# This allows us to import this module and use its functions
+# without executing the code below.
+# If this is the program being run, then execute the code below
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query archived prices and alerts.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    alerts_parser = subparsers.add_parser("alerts", help="alerts between two dates")
+    alerts_parser.add_argument("start", type=query_date)
+    alerts_parser.add_argument("end", type=query_date)
+    alerts_parser.add_argument("--metal", default=None, help="gold, silver, or ratio")
+
+    for command, help_text in (
+        ("prices", "daily prices between two dates"),
+        ("ohlc", "open, high, low, and close over two dates"),
+    ):
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument("metal", choices=["gold", "silver"])
+        command_parser.add_argument("start", type=query_date)
+        command_parser.add_argument("end", type=query_date)
+
+    args = parser.parse_args()
+    main(args.command, args.start, args.end, args.metal)
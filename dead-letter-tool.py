@@ -0,0 +1,166 @@
+"""
+    This program inspects and replays messages in the dead-letter queue.
+
+    Usage:
+        python3 dead-letter-tool.py inspect [--limit N]
+        python3 dead-letter-tool.py replay [--limit N] [--queue QUEUE_NAME]
+
+    inspect lists each dead-lettered message with the queue it came from, the reason it
+    was rejected, and its retry count, then leaves it in the dead-letter queue.
+    replay republishes messages to the queue they came from with the retry count reset,
+    then removes them from the dead-letter queue. Use --queue to replay only messages
+    from one queue.
+
+    Author: Beth Harvey
+    Date: October 4, 2023
+
+"""
+
+import pika
+import sys
+import argparse
+
+# Import dead-letter topology
+from dead_letter import DEAD_LETTER_QUEUE, RETRY_HEADER, declare_dead_letter_queue
+
+# Configure logging
+from util_logger import setup_logger
+
+logger, logname = setup_logger(__file__)
+
+
+def get_death_info(properties):
+    """Return the original queue and rejection reason recorded by RabbitMQ."""
+    headers = properties.headers or {}
+    deaths = headers.get("x-death") or []
+    if not deaths:
+        return None, "unknown"
+    # the first entry is the most recent time the message was dead-lettered
+    return deaths[0].get("queue"), deaths[0].get("reason", "unknown")
+
+
+def inspect_messages(channel, message_count: int):
+    """Log up to message_count dead-lettered messages without removing them."""
+    last_tag = None
+    for _ in range(message_count):
+        method, properties, body = channel.basic_get(
+            queue=DEAD_LETTER_QUEUE, auto_ack=False
+        )
+        if method is None:
+            break
+        last_tag = method.delivery_tag
+        queue_name, reason = get_death_info(properties)
+        retries = (properties.headers or {}).get(RETRY_HEADER, 0)
+        logger.info(
+            f"[x] From {queue_name} ({reason}, {retries} retries): {body!r}"
+        )
+
+    # put every inspected message back on the dead-letter queue
+    if last_tag is not None:
+        channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+
+
+def replay_messages(channel, message_count: int, only_queue: str = None):
+    """
+    Republish up to message_count dead-lettered messages to their original queues.
+    Each message is removed from the dead-letter queue only after the broker
+    confirms the republished copy was routed to a queue, so no message is lost
+    if the replay fails or the original queue no longer exists.
+    """
+    # have the broker confirm every publish
+    channel.confirm_delivery()
+
+    replayed = 0
+    for _ in range(message_count):
+        method, properties, body = channel.basic_get(
+            queue=DEAD_LETTER_QUEUE, auto_ack=False
+        )
+        if method is None:
+            break
+        queue_name, reason = get_death_info(properties)
+
+        # leave messages from other queues (or with no known queue) where they are
+        if queue_name is None or (only_queue and queue_name != only_queue):
+            continue
+
+        # drop the dead-letter history and retry count so the message starts fresh
+        headers = {
+            key: value
+            for key, value in (properties.headers or {}).items()
+            if not key.startswith("x-")
+        }
+        try:
+            # mandatory=True makes the broker return the message if the queue is gone,
+            # instead of confirming it and dropping it
+            channel.basic_publish(
+                exchange="",
+                routing_key=queue_name,
+                body=body,
+                properties=pika.BasicProperties(
+                    headers=headers, delivery_mode=properties.delivery_mode
+                ),
+                mandatory=True,
+            )
+        except pika.exceptions.UnroutableError:
+            # leave the message unacknowledged so it stays in the dead-letter queue
+            logger.warning(f"Queue {queue_name} does not exist. Kept {body!r} in {DEAD_LETTER_QUEUE}.")
+            continue
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        replayed += 1
+        logger.info(f"[x] Replayed {body!r} to {queue_name}")
+
+    logger.info(f"Replayed {replayed} message(s) from {DEAD_LETTER_QUEUE}.")
+
+
+# define a main function to run the program
+def main(hn: str, command: str, limit: int = None, only_queue: str = None):
+    """Connect to RabbitMQ and run the requested dead-letter command."""
+
+    try:
+        # create a blocking connection to the RabbitMQ server
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=hn))
+    except Exception as e:
+        logger.error("ERROR: connection to RabbitMQ server failed.")
+        logger.error(f"Verify the server is running on host={hn}.")
+        logger.error(f"The error says: {e}")
+        sys.exit(1)
+
+    try:
+        channel = connection.channel()
+        declare_dead_letter_queue(channel)
+
+        # only look at the messages already waiting, so requeued or skipped
+        # messages are not fetched again in the same run
+        message_count = channel.queue_declare(
+            queue=DEAD_LETTER_QUEUE, passive=True
+        ).method.message_count
+        if limit is not None:
+            message_count = min(message_count, limit)
+        logger.info(f"{message_count} message(s) to {command} in {DEAD_LETTER_QUEUE}.")
+
+        if command == "inspect":
+            inspect_messages(channel, message_count)
+        else:
+            replay_messages(channel, message_count, only_queue)
+
+    except Exception as e:
+        logger.error("ERROR: something went wrong.")
+        logger.error(f"The error says: {e}")
+        sys.exit(1)
+    finally:
+        # closing the connection returns any unacknowledged messages to the queue
+        connection.close()
+
+
+# Standard Python idiom to indicate main program entry point
+# This allows us to import this module and use its functions
+# without executing the code below.
+# If this is the program being run, then execute the code below
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or replay dead-lettered messages.")
+    parser.add_argument("command", choices=["inspect", "replay"])
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of messages")
+    parser.add_argument("--queue", default=None, help="only replay messages from this queue")
+    args = parser.parse_args()
+
+    main("localhost", args.command, args.limit, args.queue)
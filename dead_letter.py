@@ -0,0 +1,107 @@
+"""
+    Dead-letter topology and failed-message handling shared by the producer and consumers.
+
+    Every work queue is declared with a dead-letter exchange. When a consumer rejects a
+    message without requeueing it, RabbitMQ routes the message through the dead-letter
+    exchange into the dead-letter queue, so one bad message never blocks the work queue.
+
+    Messages that fail to parse (poison messages) are dead-lettered right away.
+    Other failures are retried a limited number of times by republishing the message
+    with a retry count in its headers.
+
+    Retried and replayed messages go to the end of their queue, so they are processed
+    after newer dates. The gold and silver consumers include them in their week and
+    day changes as if they were the newest price. The ratio consumer drops them,
+    because their date has already been passed.
+
+    Author: Beth Harvey
+    Date: October 4, 2023
+
+"""
+
+import pika
+
+# exchange and queue that collect rejected messages
+DEAD_LETTER_EXCHANGE = "dead-letter"
+DEAD_LETTER_QUEUE = "99-dead-letter"
+
+# number of times a failed message is retried before it is dead-lettered
+MAX_RETRIES = 3
+
+# message header that carries the number of retries so far
+RETRY_HEADER = "x-retry-count"
+
+# errors that mean the message itself is bad, so retrying will never help
+POISON_ERRORS = (ValueError, IndexError)
+
+
+def declare_dead_letter_queue(channel):
+    """Declare the durable dead-letter exchange and queue and bind them together."""
+    channel.exchange_declare(
+        exchange=DEAD_LETTER_EXCHANGE, exchange_type="fanout", durable=True
+    )
+    channel.queue_declare(queue=DEAD_LETTER_QUEUE, durable=True)
+    channel.queue_bind(queue=DEAD_LETTER_QUEUE, exchange=DEAD_LETTER_EXCHANGE)
+
+
+def declare_work_queue(channel, queue_name: str):
+    """
+    Declare a durable work queue that sends rejected messages to the dead-letter exchange.
+    The producer and consumers must declare queues the same way,
+    so always use this function instead of calling queue_declare directly.
+    """
+    declare_dead_letter_queue(channel)
+    channel.queue_declare(
+        queue=queue_name,
+        durable=True,
+        arguments={"x-dead-letter-exchange": DEAD_LETTER_EXCHANGE},
+    )
+
+
+def get_retry_count(properties) -> int:
+    """Return the number of times a message has already been retried."""
+    if properties is None or not properties.headers:
+        return 0
+    return int(properties.headers.get(RETRY_HEADER, 0))
+
+
+def handle_failed_message(ch, method, properties, body, error: Exception, logger):
+    """
+    Decide what to do with a message whose callback raised an error.
+    Poison messages and messages out of retries are rejected without requeueing,
+    which sends them to the dead-letter queue.
+    Anything else is republished to the end of its queue with its retry count increased.
+    Either way the original delivery is settled, so the consumer keeps moving.
+
+    A retried message is processed again from the start, so callbacks should only let
+    errors reach this function before they change any state. Side effects such as
+    email alerts should catch and log their own errors.
+    """
+    retries = get_retry_count(properties)
+
+    if isinstance(error, POISON_ERRORS) or retries >= MAX_RETRIES:
+        if isinstance(error, POISON_ERRORS):
+            reason = "it could not be parsed"
+        else:
+            reason = f"it failed after {retries} retries"
+        logger.warning(f"Sending message to {DEAD_LETTER_QUEUE} because {reason}: {body!r}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        return
+
+    # copy the headers so the retry count travels with the message
+    headers = dict(properties.headers or {}) if properties is not None else {}
+    headers[RETRY_HEADER] = retries + 1
+    ch.basic_publish(
+        exchange="",
+        routing_key=method.routing_key,
+        body=body,
+        properties=pika.BasicProperties(
+            headers=headers,
+            delivery_mode=properties.delivery_mode if properties is not None else None,
+        ),
+    )
+    logger.warning(
+        f"Retrying message on {method.routing_key} (retry {retries + 1} of {MAX_RETRIES})."
+    )
+    # acknowledge the original now that the retry copy is back on the queue
+    ch.basic_ack(delivery_tag=method.delivery_tag)
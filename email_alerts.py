@@ -53,6 +53,10 @@ from email.message import EmailMessage
 import tomllib  # requires Python 3.11
 import pprint
 
+# True = send email alerts (requires .env.toml, see .evn-example.toml)
+# False = do not send email alerts; alerts are still logged and archived
+SEND_EMAIL_ALERTS = True
+
 # define functions here
 
 
@@ -60,6 +64,10 @@ def createAndSendEmailAlert(email_subject: str, email_body: str):
 
     """Read outgoing email info from a TOML config file"""
 
+    # skip sending when email alerts are turned off
+    if not SEND_EMAIL_ALERTS:
+        return
+
     with open(".env.toml", "rb") as file_object:
         secret_dict = tomllib.load(file_object)
     # pprint.pprint(secret_dict)
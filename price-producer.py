@@ -1,7 +1,9 @@
 """
-    This program sends three messages to two different queues (one message per queue) on the 
-    RabbitMQ server. Each message is one daily price for either gold or silver from
-    gold-silver-prices.csv. Messages are sent every 30 seconds.
+    This program sends messages to five different queues on the RabbitMQ server.
+    Each message is one daily price for either gold or silver from gold-silver-prices.csv.
+    The first two queues feed the gold and silver consumers, the next two feed the
+    gold/silver ratio consumer, and the fifth gets the full daily prices (open, high, low,
+    close, and volume) for the archive consumer. Messages are sent every 30 seconds.
     
     Author: Beth Harvey
     Date: October 1, 2023
@@ -14,6 +16,9 @@ import webbrowser
 import csv
 import time
 
+# Import dead-letter topology so queues are declared the same way as in the consumers
+from dead_letter import declare_work_queue
+
 # Configure logging
 from util_logger import setup_logger
 
@@ -37,6 +42,9 @@ def send_message(
     host: str,
     first_queue_name: str,
     second_queue_name: str,
+    third_queue_name: str,
+    fourth_queue_name: str,
+    fifth_queue_name: str,
     input_file: str,
 ):
     """
@@ -45,7 +53,7 @@ def send_message(
 
     Parameters:
         host (str): the host name or IP address of the RabbitMQ server
-        queue names (str): names of the first, second, and third queues
+        queue names (str): names of the gold, silver, ratio gold, ratio silver, and archive price queues
         input_file (str): the name of the CSV file to be read in as messages
     """
 
@@ -55,13 +63,20 @@ def send_message(
         # use the connection to create a communication channel
         ch = conn.channel()
 
-        # delete all 3 queues to start over with fresh queues
+        # delete all 5 queues to start over with fresh queues
         ch.queue_delete(queue=first_queue_name)
         ch.queue_delete(queue=second_queue_name)
-
-        # declare all 3 durable queues again
-        ch.queue_declare(queue=first_queue_name, durable=True)
-        ch.queue_declare(queue=second_queue_name, durable=True)
+        ch.queue_delete(queue=third_queue_name)
+        ch.queue_delete(queue=fourth_queue_name)
+        ch.queue_delete(queue=fifth_queue_name)
+
+        # declare all 5 durable queues again
+        # each queue sends rejected messages to the dead-letter queue
+        declare_work_queue(ch, first_queue_name)
+        declare_work_queue(ch, second_queue_name)
+        declare_work_queue(ch, third_queue_name)
+        declare_work_queue(ch, fourth_queue_name)
+        declare_work_queue(ch, fifth_queue_name)
 
         # read each row from an input file, then construct, encode, and send messages to appropriate queues
         with open(input_file, "r") as file:
@@ -95,6 +110,25 @@ def send_message(
                 )
                 # print a message to the console for the user
                 logger.info(f"[x] Sent {second_message} to {second_queue_name}")
+                # send copies of both messages to the ratio consumer's queues
+                ch.basic_publish(
+                    exchange="", routing_key=third_queue_name, body=first_mess_encode
+                )
+                logger.info(f"[x] Sent {first_message} to {third_queue_name}")
+                ch.basic_publish(
+                    exchange="", routing_key=fourth_queue_name, body=second_mess_encode
+                )
+                logger.info(f"[x] Sent {second_message} to {fourth_queue_name}")
+                # send the full daily prices for both metals to the archive queue
+                gold_archive_message = date, "gold", gold_open, gold_high, gold_low, gold_close, gold_volume
+                silver_archive_message = date, "silver", silver_open, silver_high, silver_low, silver_close, silver_volume
+                for archive_message in (gold_archive_message, silver_archive_message):
+                    ch.basic_publish(
+                        exchange="",
+                        routing_key=fifth_queue_name,
+                        body=",".join(archive_message).encode(),
+                    )
+                    logger.info(f"[x] Sent {archive_message} to {fifth_queue_name}")
 
                 # wait 30 seconds before sending the next message to the queue
                 time.sleep(30)
@@ -118,4 +152,12 @@ if __name__ == "__main__":
         offer_rabbitmq_admin_site()
 
     # send the message to the queue
-    send_message("localhost", "01-gold", "02-silver", "gold-silver-prices.csv")
+    send_message(
+        "localhost",
+        "01-gold",
+        "02-silver",
+        "03-ratio-gold",
+        "04-ratio-silver",
+        "05-archive-prices",
+        "gold-silver-prices.csv",
+    )
@@ -0,0 +1,178 @@
+"""
+    Local archive of daily prices and fired alerts, stored in SQLite.
+
+    The archive consumer writes to it in batches, and archive-query.py reads from it.
+    Rows are only ever inserted, never updated. Both tables are keyed by metal and
+    ISO date (YYYY-MM-DD), so range queries such as "all silver alerts in 2020" or
+    "gold OHLC between two dates" are answered from the index instead of by
+    re-scanning the logs or the CSV file.
+
+    The database uses write-ahead logging (WAL), so queries can run while the
+    archive consumer is writing.
+
+    Author: Beth Harvey
+    Date: October 5, 2023
+
+"""
+
+import sqlite3
+import json
+import pathlib
+from datetime import datetime
+
+# default location of the archive database
+ARCHIVE_PATH = pathlib.Path("archive").joinpath("prices.db")
+
+# queue the consumers publish fired alerts to for archiving
+ARCHIVE_ALERT_QUEUE = "06-archive-alerts"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    metal TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    PRIMARY KEY (metal, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS alerts (
+    metal TEXT NOT NULL,
+    date TEXT NOT NULL,
+    alert_type TEXT NOT NULL,
+    value REAL,
+    message TEXT,
+    PRIMARY KEY (metal, date, alert_type)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS alerts_by_date ON alerts (date);
+"""
+
+
+def to_iso_date(date: str) -> str:
+    """Convert a date from the CSV file (such as 8/19/13) to YYYY-MM-DD."""
+    try:
+        return datetime.strptime(date, "%m/%d/%y").strftime("%Y-%m-%d")
+    except ValueError:
+        # already in YYYY-MM-DD format (raises ValueError if it is not)
+        return datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d")
+
+
+def publish_alert(ch, metal: str, date: str, alert_type: str, value: float, message: str):
+    """
+    Publish a fired alert to the archive alert queue.
+    The queue must already be declared on the channel.
+    """
+    body = json.dumps(
+        {
+            "metal": metal,
+            "date": date,
+            "alert_type": alert_type,
+            "value": value,
+            "message": message,
+        }
+    )
+    ch.basic_publish(exchange="", routing_key=ARCHIVE_ALERT_QUEUE, body=body.encode())
+
+
+class PriceArchive:
+    """
+    Append-only SQLite store for daily prices and fired alerts.
+    Use read_only=True for queries. The archive is then opened in read-only mode
+    and nothing is written to it, including the schema and pragma setup.
+    """
+
+    def __init__(self, path=ARCHIVE_PATH, read_only: bool = False):
+        path = pathlib.Path(path)
+        if read_only:
+            self.connection = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+            self.connection.row_factory = sqlite3.Row
+            return
+
+        path.parent.mkdir(exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # with WAL, NORMAL is safe against corruption and avoids an fsync per commit
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add_batch(self, prices: list, alerts: list):
+        """
+        Insert a batch of prices and alerts in a single transaction.
+        prices are (metal, date, open, high, low, close, volume) tuples and
+        alerts are (metal, date, alert_type, value, message) tuples.
+        Rows that are already archived are skipped, so a redelivered batch is harmless.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(metal, to_iso_date(date), *rest) for metal, date, *rest in prices],
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO alerts VALUES (?, ?, ?, ?, ?)",
+                [(metal, to_iso_date(date), *rest) for metal, date, *rest in alerts],
+            )
+
+    def get_prices(self, metal: str, start: str, end: str) -> list:
+        """Return the daily prices for a metal between two dates (inclusive)."""
+        return self.connection.execute(
+            """
+            SELECT * FROM prices
+            WHERE metal = ? AND date BETWEEN ? AND ?
+            ORDER BY date
+            """,
+            (metal, to_iso_date(start), to_iso_date(end)),
+        ).fetchall()
+
+    def get_ohlc(self, metal: str, start: str, end: str):
+        """
+        Return the open, high, low, and close for a metal over a date range:
+        the first open, the highest high, the lowest low, and the last close.
+        Returns None if there are no prices in the range.
+        """
+        params = {"metal": metal, "start": to_iso_date(start), "end": to_iso_date(end)}
+        row = self.connection.execute(
+            """
+            SELECT
+                MIN(date) AS start_date,
+                MAX(date) AS end_date,
+                (SELECT open FROM prices
+                 WHERE metal = :metal AND date BETWEEN :start AND :end
+                 ORDER BY date LIMIT 1) AS open,
+                MAX(high) AS high,
+                MIN(low) AS low,
+                (SELECT close FROM prices
+                 WHERE metal = :metal AND date BETWEEN :start AND :end
+                 ORDER BY date DESC LIMIT 1) AS close,
+                SUM(volume) AS volume,
+                COUNT(*) AS days
+            FROM prices
+            WHERE metal = :metal AND date BETWEEN :start AND :end
+            """,
+            params,
+        ).fetchone()
+        if row["days"] == 0:
+            return None
+        return row
+
+    def get_alerts(self, start: str, end: str, metal: str = None) -> list:
+        """Return the alerts between two dates (inclusive), optionally for one metal."""
+        if metal is None:
+            return self.connection.execute(
+                "SELECT * FROM alerts WHERE date BETWEEN ? AND ? ORDER BY date",
+                (to_iso_date(start), to_iso_date(end)),
+            ).fetchall()
+        return self.connection.execute(
+            """
+            SELECT * FROM alerts
+            WHERE metal = ? AND date BETWEEN ? AND ?
+            ORDER BY date
+            """,
+            (metal, to_iso_date(start), to_iso_date(end)),
+        ).fetchall()
@@ -0,0 +1,418 @@
+"""
+    This program listens for gold and silver messages continuously and joins the two
+    feeds by date. For every date seen on both feeds it calculates the gold/silver ratio,
+    the rolling correlation of daily gold and silver returns, and a z-score showing how
+    far the ratio sits from its recent average.
+    If the gold/silver ratio is above 90 or below 65, a ratio alert is sent.
+
+    Author: Beth Harvey
+    Date: October 3, 2023
+
+"""
+
+import pika
+import sys
+import math
+from collections import deque, OrderedDict
+
+# Import dead-letter topology and failed-message handling
+from dead_letter import declare_work_queue, handle_failed_message
+
+# Import function to archive fired alerts
+from price_archive import publish_alert, ARCHIVE_ALERT_QUEUE, to_iso_date
+
+# Import function to send email alerts
+from email_alerts import createAndSendEmailAlert
+
+# Configure logging
+from util_logger import setup_logger
+
+logger, logname = setup_logger(__file__)
+
+# ratio thresholds for alerts
+RATIO_HIGH = 90
+RATIO_LOW = 65
+
+# correlation below this value means gold and silver have stopped moving together
+CORRELATION_LOW = 0.3
+
+# z-scores beyond this value mean the ratio is far from its recent average
+ZSCORE_LIMIT = 2.5
+
+# number of joined days used for the rolling statistics
+WINDOW_SIZE = 30
+
+# a variance this small compared with the values in the window is treated as zero
+# (a flat window), since running sums never cancel out exactly in floating point
+VARIANCE_TOLERANCE = 1e-12
+
+# a variance this small compared with the largest values seen since the sums were
+# last rebuilt may be rounding error, so the sums are rebuilt before it is used
+REBUILD_TOLERANCE = 1e-6
+
+# maximum number of unmatched prices held for each metal while waiting for the other feed
+# once full, the oldest unmatched price is dropped so memory use stays bounded
+JOIN_BUFFER_SIZE = 30
+
+# unmatched prices waiting for the other feed, keyed by date in arrival order
+PENDING = {"gold": OrderedDict(), "silver": OrderedDict()}
+
+
+class RollingZScore:
+    """
+    Keeps a running sum and sum of squares over a fixed window,
+    so the mean and standard deviation are updated without re-scanning the window.
+    The sums are rebuilt from the window once per window length, and whenever the
+    variance is small enough that rounding error could matter.
+    """
+
+    def __init__(self, size: int):
+        self.values = deque(maxlen=size)
+        self.total = self.total_sq = 0.0
+        # largest sum of squares since the last rebuild, a bound on the rounding error
+        self.peak_sq = 0.0
+        self.updates = 0
+
+    def rebuild(self):
+        """Recalculate the sums exactly from the values in the window."""
+        self.total = math.fsum(self.values)
+        self.total_sq = math.fsum(v * v for v in self.values)
+        self.peak_sq = self.total_sq
+
+    def variance(self) -> float:
+        n = len(self.values)
+        return self.total_sq / n - (self.total / n) ** 2
+
+    def update(self, value: float):
+        """Add a value and return its z-score against the window (None until ready)."""
+        if len(self.values) == self.values.maxlen:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+        self.peak_sq = max(self.peak_sq, self.total_sq)
+
+        self.updates += 1
+        if self.updates % self.values.maxlen == 0:
+            self.rebuild()
+
+        n = len(self.values)
+        if n < 2:
+            return None
+        variance = self.variance()
+        if variance <= REBUILD_TOLERANCE * self.peak_sq / n:
+            self.rebuild()
+            variance = self.variance()
+        if variance <= VARIANCE_TOLERANCE * self.total_sq / n:
+            return None
+        return (value - self.total / n) / math.sqrt(variance)
+
+
+class RollingCorrelation:
+    """
+    Keeps running sums of x, y, x*x, y*y, and x*y over a fixed window,
+    so the Pearson correlation is updated without re-scanning the window.
+    The sums are rebuilt from the window once per window length, and whenever
+    either variance is small enough that rounding error could matter.
+    """
+
+    def __init__(self, size: int):
+        self.pairs = deque(maxlen=size)
+        self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+        # largest sums of squares since the last rebuild, a bound on the rounding error
+        self.peak_xx = self.peak_yy = 0.0
+        self.updates = 0
+
+    def rebuild(self):
+        """Recalculate the sums exactly from the pairs in the window."""
+        self.sx = math.fsum(x for x, _ in self.pairs)
+        self.sy = math.fsum(y for _, y in self.pairs)
+        self.sxx = math.fsum(x * x for x, _ in self.pairs)
+        self.syy = math.fsum(y * y for _, y in self.pairs)
+        self.sxy = math.fsum(x * y for x, y in self.pairs)
+        self.peak_xx, self.peak_yy = self.sxx, self.syy
+
+    def variances(self):
+        """Return n times the variance of x and of y."""
+        n = len(self.pairs)
+        return self.sxx - self.sx * self.sx / n, self.syy - self.sy * self.sy / n
+
+    def update(self, x: float, y: float):
+        """Add a pair and return the window correlation (None until ready)."""
+        if len(self.pairs) == self.pairs.maxlen:
+            old_x, old_y = self.pairs[0]
+            self.sx -= old_x
+            self.sy -= old_y
+            self.sxx -= old_x * old_x
+            self.syy -= old_y * old_y
+            self.sxy -= old_x * old_y
+        self.pairs.append((x, y))
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.syy += y * y
+        self.sxy += x * y
+        self.peak_xx = max(self.peak_xx, self.sxx)
+        self.peak_yy = max(self.peak_yy, self.syy)
+
+        self.updates += 1
+        if self.updates % self.pairs.maxlen == 0:
+            self.rebuild()
+
+        n = len(self.pairs)
+        if n < 3:
+            return None
+        var_x, var_y = self.variances()
+        if var_x <= REBUILD_TOLERANCE * self.peak_xx or var_y <= REBUILD_TOLERANCE * self.peak_yy:
+            self.rebuild()
+            var_x, var_y = self.variances()
+        if var_x <= VARIANCE_TOLERANCE * self.sxx or var_y <= VARIANCE_TOLERANCE * self.syy:
+            return None
+        cov = self.sxy - self.sx * self.sy / n
+        return cov / math.sqrt(var_x * var_y)
+
+
+RATIO_ZSCORE = RollingZScore(WINDOW_SIZE)
+RETURN_CORRELATION = RollingCorrelation(WINDOW_SIZE)
+
+# previous joined prices, used to calculate daily returns
+LAST_PRICES = {"gold": None, "silver": None}
+
+# newest joined date (YYYY-MM-DD); prices for this date or older arrive out of order
+LAST_JOINED = {"date": None}
+
+
+def join_price(metal: str, date: str, price: float):
+    """
+    Match a price against the other metal's unmatched prices.
+    Returns the (gold, silver) prices when both feeds have the date,
+    otherwise holds the price in the join buffer and returns None.
+    Prices for a date that is not newer than the last joined date are dropped.
+    Retried and replayed messages go to the end of their queue, so they arrive
+    after newer dates and their partner price has already been dropped.
+    """
+    # raises ValueError for a bad date before anything is changed
+    iso_date = to_iso_date(date)
+    if LAST_JOINED["date"] is not None and iso_date <= LAST_JOINED["date"]:
+        logger.warning(
+            f"Dropped out-of-order {metal} price for {date}. Already joined up to {LAST_JOINED['date']}."
+        )
+        return None
+
+    other = "silver" if metal == "gold" else "gold"
+    other_pending = PENDING[other]
+
+    if date in other_pending:
+        LAST_JOINED["date"] = iso_date
+        # both feeds are in date order, so anything older than this date
+        # on the other feed will never be matched and can be dropped
+        while other_pending:
+            pending_date, other_price = other_pending.popitem(last=False)
+            if pending_date == date:
+                break
+            logger.warning(f"Dropped unmatched {other} price for {pending_date}.")
+        if metal == "gold":
+            return price, other_price
+        return other_price, price
+
+    # no match yet, so wait for the other feed
+    pending = PENDING[metal]
+    pending[date] = price
+    if len(pending) > JOIN_BUFFER_SIZE:
+        dropped_date, _ = pending.popitem(last=False)
+        logger.warning(
+            f"Join buffer for {metal} is full. Dropped unmatched price for {dropped_date}."
+        )
+    return None
+
+
+def send_alert(ch, date: str, alert_type: str, value: float, message: str, email_subject: str = None):
+    """
+    Publish an alert to the archive and email it (when an email subject is given).
+    By now the join buffer and rolling statistics are already updated, so a failure
+    here is logged instead of raised. Raising would retry the message, and the retried
+    price could never be joined again.
+    The two steps are tried separately, so a failed email (for example, when
+    email is not set up) never stops the alert from being archived.
+    """
+    try:
+        publish_alert(ch, "ratio", date, alert_type, value, message)
+    except Exception as e:
+        logger.error(f"The ratio {alert_type} alert for {date} could not be archived.")
+        logger.error(f"The error says: {e}.")
+
+    if email_subject is None:
+        return
+    try:
+        createAndSendEmailAlert(email_subject, message)
+    except Exception as e:
+        logger.error(f"The ratio {alert_type} alert email for {date} could not be sent.")
+        logger.error(f"The error says: {e}.")
+
+
+def process_joined(ch, date: str, gold_price: float, silver_price: float):
+    """
+    Update the rolling statistics for a joined date
+    and send an alert if the ratio is above or below a certain value.
+    """
+    ratio = round(gold_price / silver_price, 2)
+    zscore = RATIO_ZSCORE.update(ratio)
+
+    # calculate daily returns once a previous joined day is available
+    correlation = None
+    if LAST_PRICES["gold"] is not None:
+        gold_return = gold_price / LAST_PRICES["gold"] - 1
+        silver_return = silver_price / LAST_PRICES["silver"] - 1
+        correlation = RETURN_CORRELATION.update(gold_return, silver_return)
+    LAST_PRICES["gold"] = gold_price
+    LAST_PRICES["silver"] = silver_price
+
+    logger.info(
+        f" [x] {date}: gold/silver ratio is {ratio}"
+        f" (z-score {'n/a' if zscore is None else round(zscore, 2)},"
+        f" correlation {'n/a' if correlation is None else round(correlation, 2)})."
+    )
+
+    # check for ratio over 90 and send alert
+    if ratio > RATIO_HIGH:
+        message = f"""Gold/silver ratio alert on {date}! It takes {ratio} ounces of silver to buy one ounce of gold, so silver is cheap compared to gold.
+        Gold is ${gold_price} and silver is ${silver_price}."""
+        logger.info(message)
+        send_alert(ch, date, "high", ratio, message, "Gold/Silver High Ratio Alert")
+
+    # check for ratio under 65 and send alert
+    if ratio < RATIO_LOW:
+        message = f"""Gold/silver ratio alert on {date}! It takes only {ratio} ounces of silver to buy one ounce of gold, so gold is cheap compared to silver.
+        Gold is ${gold_price} and silver is ${silver_price}."""
+        logger.info(message)
+        send_alert(ch, date, "low", ratio, message, "Gold/Silver Low Ratio Alert")
+
+    # log when the ratio moves far from its recent average
+    if zscore is not None and abs(zscore) > ZSCORE_LIMIT:
+        message = f"Ratio spread alert on {date}! The ratio of {ratio} is {round(zscore, 2)} standard deviations from its {WINDOW_SIZE}-day average."
+        logger.warning(message)
+        send_alert(ch, date, "spread", zscore, message)
+
+    # log when gold and silver stop moving together
+    if correlation is not None and correlation < CORRELATION_LOW:
+        message = f"Correlation alert on {date}! The {WINDOW_SIZE}-day correlation of gold and silver returns has dropped to {round(correlation, 2)}."
+        logger.warning(message)
+        send_alert(ch, date, "correlation", correlation, message)
+
+
+def process_message(metal: str, ch, method, properties, body):
+    """
+    Receives a message from one of the two queues,
+    extracts the date and price, joins it with the other feed,
+    and acknowledges the message.
+    """
+
+    try:
+        # decode the binary message body to a string
+        logger.info(f" [x] Received {metal} {body.decode()}")
+
+        # process queue message
+        mess = body.decode().split(",")
+        date = mess[0]
+        price = float(mess[1])
+        # float() accepts nan and inf, which would poison the running sums for good,
+        # and a zero price would divide by zero, so treat them as bad messages
+        if not (math.isfinite(price) and price > 0):
+            raise ValueError(f"price must be a positive number, not {mess[1]}")
+
+        joined = join_price(metal, date, price)
+        if joined is not None:
+            process_joined(ch, date, *joined)
+
+        # acknowledge the message was received and processed
+        # (now it can be deleted from the queue)
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    except Exception as e:
+        logger.error(f"An error has occurred with the {metal} message.")
+        logger.error(f"The error says: {e}.")
+        # nothing has changed yet (alert failures are caught in send_alert),
+        # so dead-letter a bad message or retry it a few times
+        handle_failed_message(ch, method, properties, body, e, logger)
+
+
+# define callback functions to be called when a message is received
+def gold_callback(ch, method, properties, body):
+    """Define behavior on getting a gold message."""
+    process_message("gold", ch, method, properties, body)
+
+
+def silver_callback(ch, method, properties, body):
+    """Define behavior on getting a silver message."""
+    process_message("silver", ch, method, properties, body)
+
+
+# define a main function to run the program
+def main(hn: str = "localhost", gold_qn: str = "03-ratio-gold", silver_qn: str = "04-ratio-silver"):
+    """Continuously listen for gold and silver messages on two named queues."""
+
+    # when a statement can go wrong, use a try-except block
+    try:
+        # try this code, if it works, keep going
+        # create a blocking connection to the RabbitMQ server
+        connection = pika.BlockingConnection(pika.ConnectionParameters(host=hn))
+
+    # except, if there's an error, do this
+    except Exception as e:
+        logger.error("ERROR: connection to RabbitMQ server failed.")
+        logger.error(f"Verify the server is running on host={hn}.")
+        logger.error(f"The error says: {e}")
+        sys.exit(1)
+
+    try:
+        # use the connection to create a communication channel
+        channel = connection.channel()
+
+        # use the channel to declare both durable queues
+        # rejected messages are routed to the dead-letter queue
+        declare_work_queue(channel, gold_qn)
+        declare_work_queue(channel, silver_qn)
+        # fired alerts are published to the archive alert queue
+        declare_work_queue(channel, ARCHIVE_ALERT_QUEUE)
+
+        # Set the prefetch count to one per consumer.
+        # Unmatched prices are acknowledged once they are in the join buffer,
+        # so one feed running ahead of the other never blocks the channel.
+        channel.basic_qos(prefetch_count=1)
+
+        # listen on both queues from the same channel
+        channel.basic_consume(
+            queue=gold_qn, on_message_callback=gold_callback, auto_ack=False
+        )
+        channel.basic_consume(
+            queue=silver_qn, on_message_callback=silver_callback, auto_ack=False
+        )
+
+        # print a message to the console for the user
+        logger.info(" [*] Ready for work. To exit press CTRL+C")
+
+        # start consuming messages via the communication channel
+        channel.start_consuming()
+
+    # except, in the event of an error OR user stops the process, do this
+    except Exception as e:
+        logger.error("ERROR: something went wrong.")
+        logger.error(f"The error says: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        logger.warning(" User interrupted continuous listening process.")
+        sys.exit(0)
+    finally:
+        print("\nClosing connection. Goodbye.\n")
+        connection.close()
+
+
+# Standard Python idiom to indicate main program entry point
+# This allows us to import this module and use its functions
+# without executing the code below.
+# If this is the program being run, then execute the code below
+if __name__ == "__main__":
+    # call the main function with the information needed
+    main("localhost", "03-ratio-gold", "04-ratio-silver")
@@ -11,6 +11,12 @@ import pika
 import sys
 from collections import deque
 
+# Import dead-letter topology and failed-message handling
+from dead_letter import declare_work_queue, handle_failed_message
+
+# Import function to archive fired alerts
+from price_archive import publish_alert, ARCHIVE_ALERT_QUEUE
+
 # Import function to send email alerts
 from email_alerts import createAndSendEmailAlert
 
@@ -23,6 +29,27 @@ logger, logname = setup_logger(__file__)
 SILVER_DEQUE = deque(maxlen=7)
 
 
+def send_alert(ch, email_subject: str, email_body: str, silver_date: str, alert_type: str, silver_price: float):
+    """
+    Publish an alert to the archive and email it.
+    By now the price is already in the deque, so a failure here is logged
+    instead of raised. Raising would retry the message and add the price twice.
+    The two steps are tried separately, so a failed email (for example, when
+    email is not set up) never stops the alert from being archived.
+    """
+    try:
+        publish_alert(ch, "silver", silver_date, alert_type, silver_price, email_body)
+    except Exception as e:
+        logger.error(f"The silver alert for {silver_date} could not be archived.")
+        logger.error(f"The error says: {e}.")
+
+    try:
+        createAndSendEmailAlert(email_subject, email_body)
+    except Exception as e:
+        logger.error(f"The silver alert email for {silver_date} could not be sent.")
+        logger.error(f"The error says: {e}.")
+
+
 # define a callback function to be called when a message is received
 def silver_callback(ch, method, properties, body):
     """
@@ -33,10 +60,10 @@ def silver_callback(ch, method, properties, body):
     and sends an alert if the price is above or below a certain value.
     """
 
-    # decode the binary message body to a string
-    logger.info(f" [x] Received {body.decode()}")
-
     try:
+        # decode the binary message body to a string
+        logger.info(f" [x] Received {body.decode()}")
+
         # process silver queue message
         silver_mess = body.decode().split(",")
         # add price to deque
@@ -58,7 +85,7 @@ def silver_callback(ch, method, properties, body):
                     email_subject = "Silver High Price Alert"
                     email_body = f"""Silver price alert on {silver_date}! The price of silver is ${silver_price}, so now might be a good time to sell!
                         That's a ${week_change} change since last week and a ${day_change} change since yesterday."""
-                    createAndSendEmailAlert(email_subject, email_body)
+                    send_alert(ch, email_subject, email_body, silver_date, "high", silver_price)
 
             # check for price under $15 and send alert
             if silver_price < 15:
@@ -69,7 +96,7 @@ def silver_callback(ch, method, properties, body):
                     email_subject = "Silver Low Price Alert"
                     email_body = f"""Silver price alert on {silver_date}! The price of silver is ${silver_price}, so now might be a good time to buy!
                     That's a ${week_change} change since last week and a ${day_change} change since yesterday."""
-                    createAndSendEmailAlert(email_subject, email_body)        
+                    send_alert(ch, email_subject, email_body, silver_date, "low", silver_price)
         # when done with task, tell the user
         logger.info(" [x] Processed silver price.")
         # acknowledge the message was received and processed
@@ -79,6 +106,9 @@ def silver_callback(ch, method, properties, body):
     except Exception as e:
         logger.error("An error has occurred with the silver message.")
         logger.error(f"The error says: {e}.")
+        # nothing has changed yet (alert failures are caught in send_alert),
+        # so dead-letter a bad message or retry it a few times
+        handle_failed_message(ch, method, properties, body, e, logger)
 
 
 # define a main function to run the program
@@ -106,7 +136,10 @@ def main(hn: str = "localhost", qn: str = "task_queue"):
         # a durable queue will survive a RabbitMQ server restart
         # and help ensure messages are processed in order
         # messages will not be deleted until the consumer acknowledges
-        channel.queue_declare(queue=qn, durable=True)
+        # rejected messages are routed to the dead-letter queue
+        declare_work_queue(channel, qn)
+        # fired alerts are published to the archive alert queue
+        declare_work_queue(channel, ARCHIVE_ALERT_QUEUE)
 
         # The QoS level controls the # of messages
         # that can be in-flight (unacknowledged by the consumer)